@@ -4,6 +4,7 @@ from logging.handlers import RotatingFileHandler
 from flask import Flask
 from celery import Celery, Task
 from config import Config
+from .services.batch_dispatcher import ShortClipBatcher
 from flask_bootstrap import Bootstrap # For Bootstrap integration
 import arrow # For the datetimeformat filter
 import datetime # For the datetimeformat filter
@@ -28,6 +29,13 @@ def create_app(config_class=Config):
 
     # Initialize Celery
     celery_init_app(app)
+
+    # Short-clip micro-batching (used by the /upload route)
+    if app.config.get('MICROBATCH_ENABLED'):
+        app.extensions["short_clip_batcher"] = ShortClipBatcher(
+            window_ms=app.config['MICROBATCH_WINDOW_MS'],
+            max_batch_size=app.config['MICROBATCH_MAX_SIZE']
+        )
     
     # Initialize Bootstrap
     bootstrap = Bootstrap(app) 
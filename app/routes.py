@@ -1,4 +1,8 @@
 import os
+import re
+import glob
+import math
+import time
 import uuid
 import json 
 from flask import (
@@ -9,26 +13,12 @@ from werkzeug.utils import secure_filename
 from celery.result import AsyncResult
 
 # Import the NEW Celery task for cleanup
-from .tasks import perform_audio_cleanup_task # <<< ENSURE THIS IS THE IMPORT
+from .tasks import perform_audio_cleanup_task, perform_audio_preview_task # <<< ENSURE THIS IS THE IMPORT
+from .services.audio_processor import probe_wav_duration_ms
 from .utils.file_validator import is_allowed_file
 
-@current_app.route('/', methods=['GET'])
-def index():
-    return render_template('index.html', app_name="Audio Clarity Toolkit")
-
-@current_app.route('/upload', methods=['POST'])
-def upload_audio():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part in the request'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected for uploading'}), 400
-
-    output_format = request.form.get('output_format', 'wav').lower()
-    if output_format not in current_app.config['ALLOWED_EXTENSIONS']:
-        output_format = 'wav'
-
+def _parse_cleanup_options():
+    """Parses the 'cleanup_options' form field. Returns (options, None) or (None, error_response)."""
     cleanup_options_json = request.form.get('cleanup_options', '{}') 
     try:
         cleanup_options = json.loads(cleanup_options_json)
@@ -36,49 +26,128 @@ def upload_audio():
             raise ValueError("Cleanup options must be a dictionary.")
     except json.JSONDecodeError:
         current_app.logger.error(f"Invalid JSON for cleanup_options: {cleanup_options_json}")
-        return jsonify({'error': 'Invalid cleanup configuration data.'}), 400
+        return None, (jsonify({'error': 'Invalid cleanup configuration data.'}), 400)
     except ValueError as ve:
         current_app.logger.error(f"Validation error for cleanup_options: {ve}")
-        return jsonify({'error': str(ve)}), 400
+        return None, (jsonify({'error': str(ve)}), 400)
+    return cleanup_options, None
+
+def _save_uploaded_file(file, suffix='input'):
+    """
+    Saves an uploaded file as '<unique_id>_<suffix>.<ext>'. Returns (original_filename, unique_id, input_filepath).
+    /preview uses suffix 'preview_input' so cleanup_preview_uploads_task can expire the inputs it keeps.
+    """
+    original_filename = secure_filename(file.filename)
+    file_ext = ''
+    if '.' in original_filename:
+        file_ext = original_filename.rsplit('.', 1)[1].lower()
+    
+    unique_id = uuid.uuid4().hex
+    temp_input_filename = f"{unique_id}_{suffix}.{file_ext}" if file_ext else f"{unique_id}_{suffix}"
+    input_filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], temp_input_filename)
+    
+    file.save(input_filepath)
+    current_app.logger.info(f"File {original_filename} (saved as {temp_input_filename}) uploaded to {input_filepath}")
+    return original_filename, unique_id, input_filepath
+
+def _get_upload_source():
+    """
+    Returns (file, stored_input, error_response) for /upload and /preview.
+    If the form has an 'upload_id' from an earlier /preview, stored_input is (original_filename, unique_id,
+    input_filepath) of the file kept on the server, so the client doesn't send the bytes again.
+    Otherwise file is the validated uploaded file.
+    """
+    upload_id = request.form.get('upload_id', '')
+    if upload_id:
+        if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+            return None, None, (jsonify({'error': 'Invalid upload id.'}), 400)
+        matches = glob.glob(os.path.join(current_app.config['UPLOAD_FOLDER'], f"{upload_id}_preview_input*"))
+        if not matches:
+            return None, None, (jsonify({'error': 'Uploaded file not found or expired. Please upload it again.', 'upload_expired': True}), 404)
+        original_filename = secure_filename(request.form.get('original_filename', '')) or os.path.basename(matches[0])
+        return None, (original_filename, upload_id, matches[0]), None
+
+    if 'file' not in request.files:
+        return None, None, (jsonify({'error': 'No file part in the request'}), 400)
+    
+    file = request.files['file']
+    if file.filename == '':
+        return None, None, (jsonify({'error': 'No file selected for uploading'}), 400)
 
     is_valid, validation_msg = is_allowed_file(file.filename, file.stream)
     if not is_valid:
         current_app.logger.warning(f"Upload rejected: {file.filename}, Reason: {validation_msg}")
-        return jsonify({'error': validation_msg}), 400
+        return None, None, (jsonify({'error': validation_msg}), 400)
+    return file, None, None
+
+@current_app.route('/', methods=['GET'])
+def index():
+    return render_template('index.html', app_name="Audio Clarity Toolkit")
+
+@current_app.route('/upload', methods=['POST'])
+def upload_audio():
+    output_format = request.form.get('output_format', 'wav').lower()
+    if output_format not in current_app.config['ALLOWED_EXTENSIONS']:
+        output_format = 'wav'
+
+    cleanup_options, error_response = _parse_cleanup_options()
+    if error_response:
+        return error_response
+
+    file, stored_input, error_response = _get_upload_source()
+    if error_response:
+        return error_response
+
+    if stored_input:
+        # Hand the preview-kept file over to this job: renamed, it is no longer subject to the preview TTL
+        # and is deleted by the job like any other upload.
+        original_filename, unique_id, preview_filepath = stored_input
+        job_filepath = os.path.join(os.path.dirname(preview_filepath), os.path.basename(preview_filepath).replace('_preview_input', '_input', 1))
+        try:
+            os.replace(preview_filepath, job_filepath)
+        except FileNotFoundError:
+            return jsonify({'error': 'Uploaded file not found or expired. Please upload it again.', 'upload_expired': True}), 404
+        stored_input = (original_filename, unique_id, job_filepath)
 
     try:
-        original_filename = secure_filename(file.filename)
-        file_ext = ''
-        if '.' in original_filename:
-            file_ext = original_filename.rsplit('.', 1)[1].lower()
-        
-        unique_id = uuid.uuid4().hex
-        temp_input_filename = f"{unique_id}_input.{file_ext}" if file_ext else f"{unique_id}_input"
-        input_filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], temp_input_filename)
-        
-        file.save(input_filepath)
-        current_app.logger.info(f"File {original_filename} (saved as {temp_input_filename}) uploaded to {input_filepath}")
+        original_filename, unique_id, input_filepath = stored_input or _save_uploaded_file(file)
 
         output_filename_base = f"cleaned_{unique_id}_{os.path.splitext(original_filename)[0]}"
 
-        task = perform_audio_cleanup_task.delay( # Calls the cleanup task
-            input_filepath, 
-            original_filename, 
-            output_filename_base, 
-            output_format,
-            cleanup_options 
-        )
-        current_app.logger.info(f"Dispatched Celery cleanup task {task.id} for {original_filename} with options: {cleanup_options}")
+        queued_at = time.time()
+        batcher = current_app.extensions.get('short_clip_batcher')
+        duration_ms = probe_wav_duration_ms(input_filepath) if batcher else None # Only WAV is batched: its header gives the length for free
+        if duration_ms is not None and duration_ms <= current_app.config['MICROBATCH_MAX_DURATION_S'] * 1000:
+            task_id = batcher.submit( # Short clip: cleaned together with other short clips
+                input_filepath,
+                original_filename,
+                output_filename_base,
+                output_format,
+                cleanup_options
+            )
+            task = None
+            current_app.logger.info(f"Queued {original_filename} for batched cleanup as task {task_id} with options: {cleanup_options}")
+        else:
+            task = perform_audio_cleanup_task.delay( # Calls the cleanup task
+                input_filepath, 
+                original_filename, 
+                output_filename_base, 
+                output_format,
+                cleanup_options 
+            )
+            task_id = task.id
+            current_app.logger.info(f"Dispatched Celery cleanup task {task.id} for {original_filename} with options: {cleanup_options}")
 
         return jsonify({
-            'task_id': task.id,
-            'status_url': url_for('task_status', task_id=task.id, _external=True),
+            'task_id': task_id,
+            'status_url': url_for('task_status', task_id=task_id, _external=True),
+            'queued_at': queued_at,
             'message': 'File upload successful, audio cleanup started...'
         }), 202
 
     except Exception as e:
-        current_app.logger.error(f"Error during file upload or task dispatch for {file.filename if file else 'Unknown file'}: {e}", exc_info=True)
-        if 'input_filepath' in locals() and os.path.exists(input_filepath) and 'task' not in locals():
+        current_app.logger.error(f"Error during file upload or task dispatch for {file.filename if file else 'stored upload'}: {e}", exc_info=True)
+        if not stored_input and 'input_filepath' in locals() and os.path.exists(input_filepath) and 'task' not in locals():
              try:
                 os.remove(input_filepath)
                 current_app.logger.info(f"Cleaned up {input_filepath} after upload error.")
@@ -86,6 +155,71 @@ def upload_audio():
                 current_app.logger.error(f"Could not remove {input_filepath} after upload error.")
         return jsonify({'error': f'Server error during upload: {str(e)}'}), 500
 
+@current_app.route('/preview', methods=['POST'])
+def preview_audio():
+    output_format = request.form.get('output_format', 'wav').lower()
+    if output_format not in current_app.config['ALLOWED_EXTENSIONS']:
+        output_format = 'wav'
+
+    try:
+        start_s = float(request.form.get('preview_start_s', 0))
+        duration_s = float(request.form.get('preview_duration_s', current_app.config['PREVIEW_DEFAULT_DURATION_S']))
+    except ValueError:
+        return jsonify({'error': 'Preview start and duration must be numbers.'}), 400
+    if not (math.isfinite(start_s) and math.isfinite(duration_s)):
+        return jsonify({'error': 'Preview start and duration must be finite numbers.'}), 400
+    start_s = max(0.0, start_s)
+    if duration_s <= 0:
+        return jsonify({'error': 'Preview duration must be positive.'}), 400
+    duration_s = min(duration_s, current_app.config['PREVIEW_MAX_DURATION_S'])
+
+    cleanup_options, error_response = _parse_cleanup_options()
+    if error_response:
+        return error_response
+
+    file, stored_input, error_response = _get_upload_source()
+    if error_response:
+        return error_response
+
+    if stored_input:
+        try:
+            os.utime(stored_input[2]) # PREVIEW_UPLOAD_TTL_S counts from the latest preview
+        except FileNotFoundError:
+            return jsonify({'error': 'Uploaded file not found or expired. Please upload it again.', 'upload_expired': True}), 404
+
+    try:
+        original_filename, unique_id, input_filepath = stored_input or _save_uploaded_file(file, suffix='preview_input')
+
+        output_filename_base = f"preview_{uuid.uuid4().hex}_{os.path.splitext(original_filename)[0]}"
+
+        task = perform_audio_preview_task.delay( # Routed to the 'preview' queue via CELERY_TASK_ROUTES
+            input_filepath,
+            original_filename,
+            output_filename_base,
+            output_format,
+            cleanup_options,
+            int(start_s * 1000),
+            int(duration_s * 1000)
+        )
+        current_app.logger.info(f"Dispatched Celery preview task {task.id} for {original_filename} (start={start_s}s, duration={duration_s}s)")
+
+        return jsonify({
+            'task_id': task.id,
+            'status_url': url_for('task_status', task_id=task.id, _external=True),
+            'upload_id': unique_id, # Send this instead of the file on later /preview and /upload calls
+            'message': 'Preview started...'
+        }), 202
+
+    except Exception as e:
+        current_app.logger.error(f"Error during preview upload or task dispatch for {file.filename if file else 'stored upload'}: {e}", exc_info=True)
+        if not stored_input and 'input_filepath' in locals() and os.path.exists(input_filepath) and 'task' not in locals():
+             try:
+                os.remove(input_filepath)
+                current_app.logger.info(f"Cleaned up {input_filepath} after preview error.")
+             except OSError:
+                current_app.logger.error(f"Could not remove {input_filepath} after preview error.")
+        return jsonify({'error': f'Server error during preview: {str(e)}'}), 500
+
 @current_app.route('/status/<task_id>', methods=['GET'])
 def task_status(task_id):
     celery_app = current_app.extensions['celery']
@@ -1,5 +1,8 @@
 import os
+import wave
 import logging
+import tempfile
+import subprocess
 from pydub import AudioSegment
 from pydub.effects import normalize as pydub_normalize
 from pydub.effects import high_pass_filter as pydub_high_pass
@@ -7,6 +10,7 @@ from pydub.silence import detect_nonsilent # For silence trimming
 import numpy as np
 import noisereduce # Ensure this is installed: pip install noisereduce
 import math # For log10 if used in any effect
+from scipy.signal import lfilter # For the batched high-pass filter
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +23,25 @@ DEFAULT_TRIM_INSERT_SILENCE_MS = 500
 DEFAULT_TRIM_CHUNK_MIN_DURATION_MS = 500
 DEFAULT_SILENCE_THRESH_DB = -40 # Crucial definition for silence trimming
 
+# --- Preview Parameters ---
+# Noise reduction dominates preview latency and grows faster than linearly with the decoded span:
+# on 44.1 kHz stereo a 5 s window takes ~0.45 s end to end, a 10 s window ~1.3 s, 20 s ~2.1 s.
+DEFAULT_PREVIEW_DURATION_MS = 5000
+# Audio decoded on each side of the preview window. noisereduce's non-stationary mode smooths its
+# noise estimate over time_constant_s (2 s by default) with a forward-backward filter, so it looks at
+# audio both before and after each point; one time constant of real context on each side keeps the
+# window close to what the full job produces there. Cropped off before normalization and trimming.
+DEFAULT_PREVIEW_CONTEXT_MS = 2000
+
+# --- Micro-batch Parameters ---
+DEFAULT_BATCH_MAX_DURATION_MS = 30000 # Longer clips are not padded into a shared batch array
+BATCH_SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32} # pydub widens 24-bit audio to 32-bit on load
+# float32 holds 8/16-bit samples exactly and halves batch memory; 32-bit samples need float64.
+BATCH_FLOAT_DTYPES = {1: np.float32, 2: np.float32, 4: np.float64}
+
+# Order in which cleanup stages are applied (noise reduction works best on the raw signal).
+CLEANUP_STAGE_ORDER = ('noise_reduce', 'high_pass', 'normalize', 'trim_silence')
+
 # --- Helper Functions for Cleanup Operations ---
 
 def _apply_normalization(audio_segment, target_dbfs=DEFAULT_NORMALIZATION_TARGET_DBFS):
@@ -170,52 +193,31 @@ def _apply_silence_trimming(audio_segment,
     logger.info("Silence trimming: Audio reconstructed with standardized silences.")
     return final_audio
 
-# --- Main Cleanup Processing Function ---
-def cleanup_audio_core(
-    input_path, 
-    output_path, 
-    output_format="wav",
-    cleanup_options=None, 
-    task_update_meta_func=None
-    ):
-    if cleanup_options is None: cleanup_options = {}
-    
-    try:
-        logger.info(f"Audio cleanup task started. Input='{input_path}', Output='{output_path}', Options={cleanup_options}")
-        if task_update_meta_func: task_update_meta_func(state='PROGRESS', meta={'status': 'Loading audio...', 'progress': 5})
-
-        audio = AudioSegment.from_file(input_path)
-        logger.info(f"Loaded audio: Duration={len(audio)/1000.0:.2f}s, Channels={audio.channels}, SR={audio.frame_rate}Hz, SampleWidth={audio.sample_width}")
-
-        current_progress = 10
-        active_steps = sum(1 for option_key in ['noise_reduce', 'high_pass', 'normalize', 'trim_silence'] if cleanup_options.get(option_key, {}).get('enabled'))
-        progress_increment = (80 - current_progress) / active_steps if active_steps > 0 else 0
+# --- Stage Chain & Export Helpers ---
 
+def _apply_cleanup_stages(audio, cleanup_options, stages=CLEANUP_STAGE_ORDER,
+                          task_update_meta_func=None, progress_start=10, progress_end=80):
+    """Runs the enabled cleanup stages from `stages` (in CLEANUP_STAGE_ORDER) on an AudioSegment."""
+    active_stages = [key for key in CLEANUP_STAGE_ORDER if key in stages and cleanup_options.get(key, {}).get('enabled')]
+    current_progress = progress_start
+    progress_increment = (progress_end - progress_start) / len(active_stages) if active_stages else 0
 
-        if cleanup_options.get('noise_reduce', {}).get('enabled'):
+    for stage_key in active_stages:
+        params = cleanup_options[stage_key]
+        if stage_key == 'noise_reduce':
             if task_update_meta_func: task_update_meta_func(state='PROGRESS', meta={'status': 'Applying Noise Reduction...', 'progress': int(current_progress)})
-            strength = cleanup_options['noise_reduce'].get('strength', DEFAULT_NOISE_REDUCTION_STRENGTH)
-            audio = _apply_noise_reduction(audio, strength)
-            current_progress += progress_increment
+            audio = _apply_noise_reduction(audio, params.get('strength', DEFAULT_NOISE_REDUCTION_STRENGTH))
             logger.info("Noise reduction applied.")
-
-        if cleanup_options.get('high_pass', {}).get('enabled'):
+        elif stage_key == 'high_pass':
             if task_update_meta_func: task_update_meta_func(state='PROGRESS', meta={'status': 'Applying High-Pass Filter...', 'progress': int(current_progress)})
-            cutoff_hz = cleanup_options['high_pass'].get('cutoff_hz', DEFAULT_HPF_CUTOFF_HZ)
-            audio = _apply_high_pass_filter(audio, cutoff_hz)
-            current_progress += progress_increment
+            audio = _apply_high_pass_filter(audio, params.get('cutoff_hz', DEFAULT_HPF_CUTOFF_HZ))
             logger.info("High-pass filter applied.")
-
-        if cleanup_options.get('normalize', {}).get('enabled'):
+        elif stage_key == 'normalize':
             if task_update_meta_func: task_update_meta_func(state='PROGRESS', meta={'status': 'Normalizing Volume...', 'progress': int(current_progress)})
-            target_dbfs = cleanup_options['normalize'].get('target_dbfs', DEFAULT_NORMALIZATION_TARGET_DBFS)
-            audio = _apply_normalization(audio, target_dbfs)
-            current_progress += progress_increment
+            audio = _apply_normalization(audio, params.get('target_dbfs', DEFAULT_NORMALIZATION_TARGET_DBFS))
             logger.info("Normalization applied.")
-
-        if cleanup_options.get('trim_silence', {}).get('enabled'):
+        elif stage_key == 'trim_silence':
             if task_update_meta_func: task_update_meta_func(state='PROGRESS', meta={'status': 'Trimming Silences...', 'progress': int(current_progress)})
-            params = cleanup_options['trim_silence']
             audio = _apply_silence_trimming(
                 audio,
                 min_silence_ms=params.get('min_silence_ms', DEFAULT_TRIM_MIN_SILENCE_MS),
@@ -223,17 +225,40 @@ def cleanup_audio_core(
                 chunk_min_duration_ms=params.get('chunk_min_duration_ms', DEFAULT_TRIM_CHUNK_MIN_DURATION_MS),
                 silence_thresh_db=params.get('silence_thresh_db', DEFAULT_SILENCE_THRESH_DB)
             )
-            # current_progress += progress_increment # Already accounted for if active_steps was calculated correctly
             logger.info("Silence trimming applied.")
+        current_progress += progress_increment
+    return audio
+
+def _export_audio(audio, output_path, output_format):
+    """Exports an AudioSegment using the export settings for the requested output format."""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    export_params = {"format": "wav"}
+    if output_format.lower() == "mp3": export_params = {"format": "mp3", "bitrate": "192k"}
+    elif output_format.lower() == "m4a": export_params = {"format": "ipod"}
+    audio.export(output_path, **export_params)
+
+# --- Main Cleanup Processing Function ---
+def cleanup_audio_core(
+    input_path, 
+    output_path, 
+    output_format="wav",
+    cleanup_options=None, 
+    task_update_meta_func=None
+    ):
+    if cleanup_options is None: cleanup_options = {}
+    
+    try:
+        logger.info(f"Audio cleanup task started. Input='{input_path}', Output='{output_path}', Options={cleanup_options}")
+        if task_update_meta_func: task_update_meta_func(state='PROGRESS', meta={'status': 'Loading audio...', 'progress': 5})
+
+        audio = AudioSegment.from_file(input_path)
+        logger.info(f"Loaded audio: Duration={len(audio)/1000.0:.2f}s, Channels={audio.channels}, SR={audio.frame_rate}Hz, SampleWidth={audio.sample_width}")
+
+        audio = _apply_cleanup_stages(audio, cleanup_options, task_update_meta_func=task_update_meta_func)
         
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
         logger.info(f"Exporting cleaned audio to '{output_path}' as '{output_format}'...")
         if task_update_meta_func: task_update_meta_func(state='PROGRESS', meta={'status': 'Exporting file...', 'progress': 90})
-        
-        export_params = {"format": "wav"}
-        if output_format.lower() == "mp3": export_params = {"format": "mp3", "bitrate": "192k"}
-        elif output_format.lower() == "m4a": export_params = {"format": "ipod"}
-        audio.export(output_path, **export_params)
+        _export_audio(audio, output_path, output_format)
         
         logger.info("Audio cleanup processing complete.")
         if task_update_meta_func: task_update_meta_func(state='SUCCESS', meta={'status': 'Audio cleaned successfully!', 'progress': 100, 'result_filename': os.path.basename(output_path)})
@@ -247,3 +272,238 @@ def cleanup_audio_core(
             except OSError as oe: logger.error(f"Could not remove partial output '{output_path}': {oe}")
         return False, str(e)
     finally: pass
+
+# --- Preview Processing Function ---
+
+def _load_excerpt(input_path, start_ms, duration_ms):
+    """
+    Decodes only [start_ms, start_ms + duration_ms) of an audio file.
+    PCM WAV files are read directly at the start frame with the wave module. Anything else goes
+    through ffmpeg with -ss placed before -i, so ffmpeg seeks in the container instead of decoding
+    and discarding everything before the offset (which is what pydub's start_second does).
+    """
+    try:
+        with wave.open(input_path, 'rb') as wav_file:
+            if wav_file.getsampwidth() in (1, 2, 4): # pydub widens 24-bit audio; let ffmpeg handle it
+                frame_rate = wav_file.getframerate()
+                wav_file.setpos(min(int(start_ms * frame_rate / 1000), wav_file.getnframes()))
+                data = wav_file.readframes(int(duration_ms * frame_rate / 1000))
+                if wav_file.getsampwidth() == 1: # WAV stores 8-bit audio unsigned, pydub expects signed
+                    data = (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128).astype(np.int8).tobytes()
+                return AudioSegment(data, frame_rate=frame_rate, sample_width=wav_file.getsampwidth(), channels=wav_file.getnchannels())
+    except (wave.Error, EOFError):
+        pass # Not a PCM WAV file
+
+    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as excerpt_file:
+        excerpt_path = excerpt_file.name
+    try:
+        command = [
+            AudioSegment.converter, '-y', '-v', 'error',
+            '-ss', f'{start_ms / 1000.0:.3f}', '-t', f'{duration_ms / 1000.0:.3f}',
+            '-i', input_path, '-vn', '-acodec', 'pcm_s16le', excerpt_path
+        ]
+        result = subprocess.run(command, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to decode excerpt: {result.stderr.decode(errors='replace').strip()}")
+        return AudioSegment.from_wav(excerpt_path)
+    finally:
+        if os.path.exists(excerpt_path):
+            os.remove(excerpt_path)
+
+def preview_audio_core(
+    input_path,
+    output_path,
+    output_format="wav",
+    cleanup_options=None,
+    start_ms=0,
+    duration_ms=DEFAULT_PREVIEW_DURATION_MS,
+    context_ms=DEFAULT_PREVIEW_CONTEXT_MS
+    ):
+    """
+    Runs the cleanup stage chain on a short excerpt of the input so settings can be auditioned quickly.
+    Only the window plus context_ms of audio on each side is decoded (see _load_excerpt). Noise
+    reduction and the (vectorized) high-pass filter run over the whole span; the context is then cropped off
+    before normalization and trimming. Normalization uses the excerpt's own peak, so the preview's
+    loudness can differ from the full job's.
+    """
+    if cleanup_options is None: cleanup_options = {}
+
+    try:
+        start_ms = max(0, int(start_ms))
+        duration_ms = max(1, int(duration_ms))
+        lead_in_ms = min(max(0, int(context_ms)), start_ms)
+        lead_out_ms = max(0, int(context_ms))
+        logger.info(f"Audio preview started. Input='{input_path}', Output='{output_path}', Start={start_ms}ms, Duration={duration_ms}ms, Context={lead_in_ms}/{lead_out_ms}ms")
+
+        audio = _load_excerpt(input_path, start_ms - lead_in_ms, lead_in_ms + duration_ms + lead_out_ms)
+        if len(audio) <= lead_in_ms:
+            return False, "Preview start is beyond the end of the audio."
+        logger.info(f"Loaded preview excerpt: Duration={len(audio)/1000.0:.2f}s, Channels={audio.channels}, SR={audio.frame_rate}Hz")
+
+        audio = _apply_cleanup_stages(audio, cleanup_options, stages=('noise_reduce',))
+        high_pass_options = cleanup_options.get('high_pass', {})
+        if high_pass_options.get('enabled'):
+            # pydub's filter loops over samples in Python; run the vectorized one as a batch of one.
+            batch, lengths = _segments_to_batch([audio])
+            _apply_high_pass_filter_batch(batch, audio.frame_rate, audio.sample_width, high_pass_options.get('cutoff_hz', DEFAULT_HPF_CUTOFF_HZ))
+            audio = _batch_row_to_segment(batch, 0, lengths[0], audio.frame_rate, audio.sample_width)
+        audio = audio[lead_in_ms:lead_in_ms + duration_ms]
+        audio = _apply_cleanup_stages(audio, cleanup_options, stages=('normalize', 'trim_silence'))
+
+        _export_audio(audio, output_path, output_format)
+        logger.info(f"Audio preview exported to '{output_path}'.")
+        return True, os.path.basename(output_path)
+
+    except Exception as e:
+        logger.error(f"Error in preview_audio_core for '{input_path}': {e}", exc_info=True)
+        if os.path.exists(output_path):
+            try: os.remove(output_path)
+            except OSError as oe: logger.error(f"Could not remove partial preview '{output_path}': {oe}")
+        return False, str(e)
+
+# --- Batched Cleanup Helpers ---
+# Short clips with the same sample rate, channel count and sample width are stacked into one
+# zero-padded (batch x channels x frames) array of integer-valued samples. The high-pass filter and
+# normalization run on the whole array, in place where possible; noise reduction and silence trimming
+# depend on each clip's own statistics, so they still run clip by clip on the unpadded samples.
+
+def probe_wav_duration_ms(path):
+    """Returns the duration of a PCM WAV file from its header, or None if it isn't one."""
+    try:
+        with wave.open(path, 'rb') as wav_file:
+            return wav_file.getnframes() * 1000.0 / wav_file.getframerate()
+    except (wave.Error, EOFError, OSError, ZeroDivisionError):
+        return None
+
+def _segments_to_batch(segments):
+    """Stacks AudioSegments of one format into a padded (batch, channels, frames) float array."""
+    channels = segments[0].channels
+    dtype = BATCH_FLOAT_DTYPES[segments[0].sample_width]
+    lengths = [int(segment.frame_count()) for segment in segments]
+    batch = np.zeros((len(segments), channels, max(lengths)), dtype=dtype)
+    for i, segment in enumerate(segments):
+        samples = np.frombuffer(segment.raw_data, dtype=BATCH_SAMPLE_DTYPES[segment.sample_width])
+        batch[i, :, :lengths[i]] = samples.reshape(-1, channels).T
+    return batch, lengths
+
+def _batch_row_to_segment(batch, index, length, frame_rate, sample_width):
+    """Converts one row of a padded batch array back into an AudioSegment of its original length."""
+    channels = batch.shape[1]
+    samples = batch[index, :, :length].T.reshape(-1).astype(BATCH_SAMPLE_DTYPES[sample_width])
+    return AudioSegment(samples.tobytes(), frame_rate=frame_rate, sample_width=sample_width, channels=channels)
+
+def _apply_high_pass_filter_batch(batch, frame_rate, sample_width, cutoff_hz=DEFAULT_HPF_CUTOFF_HZ):
+    """Vectorized equivalent of pydub's first-order high-pass filter over a whole batch array."""
+    logger.info(f"Applying batched high-pass filter with cutoff {cutoff_hz} Hz to {batch.shape[0]} clips.")
+    if not isinstance(cutoff_hz, (int, float)) or cutoff_hz <= 0:
+        logger.warning(f"Invalid high-pass cutoff: {cutoff_hz}. Must be positive. Using default.")
+        cutoff_hz = DEFAULT_HPF_CUTOFF_HZ
+    if cutoff_hz >= frame_rate / 2:
+        logger.warning(f"High-pass cutoff {int(cutoff_hz)}Hz is too high for sample rate {frame_rate}Hz. Skipping filter.")
+        return batch
+    rc = 1.0 / (int(cutoff_hz) * 2 * math.pi)
+    dt = 1.0 / frame_rate
+    alpha = rc / (rc + dt)
+    # y[0] = x[0], y[i] = alpha * (y[i-1] + x[i] - x[i-1]); the initial state reproduces y[0] = x[0].
+    # Coefficients share the batch dtype so lfilter doesn't upcast a float32 batch to float64.
+    b = np.array([alpha, -alpha], dtype=batch.dtype)
+    a = np.array([1.0, -alpha], dtype=batch.dtype)
+    initial_state = (1.0 - alpha) * batch[..., :1]
+    filtered, _ = lfilter(b, a, batch, axis=-1, zi=initial_state)
+    # Like pydub, saturate at the sample range so steep steps can't wrap around when cast back.
+    max_amplitude = float(2 ** (8 * sample_width - 1))
+    np.clip(filtered, -max_amplitude, max_amplitude - 1, out=filtered)
+    return np.trunc(filtered, out=filtered)
+
+def _apply_normalization_batch(batch, sample_width, target_dbfs=DEFAULT_NORMALIZATION_TARGET_DBFS):
+    """Vectorized equivalent of _apply_normalization: per-clip peak normalization of a batch array."""
+    logger.info(f"Normalizing {batch.shape[0]} clips to {target_dbfs} dBFS.")
+    if not isinstance(target_dbfs, (int, float)) or target_dbfs > 0:
+        logger.warning(f"Invalid target_dbfs: {target_dbfs}. Must be 0 or negative. Using default.")
+        target_dbfs = DEFAULT_NORMALIZATION_TARGET_DBFS
+    max_amplitude = float(2 ** (8 * sample_width - 1))
+    target_peak = max_amplitude * (10 ** (-abs(target_dbfs) / 20.0))
+    peaks = np.abs(batch).max(axis=(1, 2), keepdims=True) # Zero padding never raises a clip's peak
+    gains = np.where(peaks > 0, target_peak / np.maximum(peaks, 1.0), 1.0).astype(batch.dtype)
+    batch *= gains
+    # pydub's apply_gain (audioop.mul) clips and then rounds toward minus infinity.
+    np.clip(batch, -max_amplitude, max_amplitude - 1, out=batch)
+    return np.floor(batch, out=batch)
+
+def _apply_cleanup_stages_batch(segments, cleanup_options):
+    """Runs the enabled cleanup stages on AudioSegments that share frame rate, channels and sample width."""
+    frame_rate = segments[0].frame_rate
+    sample_width = segments[0].sample_width
+
+    if cleanup_options.get('noise_reduce', {}).get('enabled'):
+        strength = cleanup_options['noise_reduce'].get('strength', DEFAULT_NOISE_REDUCTION_STRENGTH)
+        segments = [_apply_noise_reduction(segment, strength) for segment in segments]
+        sample_width = segments[0].sample_width
+
+    batch, lengths = _segments_to_batch(segments)
+    if cleanup_options.get('high_pass', {}).get('enabled'):
+        batch = _apply_high_pass_filter_batch(batch, frame_rate, sample_width, cleanup_options['high_pass'].get('cutoff_hz', DEFAULT_HPF_CUTOFF_HZ))
+    if cleanup_options.get('normalize', {}).get('enabled'):
+        batch = _apply_normalization_batch(batch, sample_width, cleanup_options['normalize'].get('target_dbfs', DEFAULT_NORMALIZATION_TARGET_DBFS))
+    segments = [_batch_row_to_segment(batch, i, length, frame_rate, sample_width) for i, length in enumerate(lengths)]
+    del batch
+
+    if cleanup_options.get('trim_silence', {}).get('enabled'):
+        segments = [_apply_cleanup_stages(segment, cleanup_options, stages=('trim_silence',)) for segment in segments]
+    return segments
+
+# --- Batched Cleanup Processing Function ---
+def cleanup_audio_batch_core(jobs, cleanup_options=None, max_batch_duration_ms=DEFAULT_BATCH_MAX_DURATION_MS, on_result=None):
+    """
+    Cleans several short clips that share the same cleanup options in one pass.
+    `jobs` is a list of dicts with 'input_path', 'output_path' and 'output_format'. Returns a list of
+    (success, result_or_error) tuples in the same order, matching cleanup_audio_core's return value.
+    If given, on_result(index, success, result_or_error) is called as soon as each clip is done, so
+    callers can publish a clip's result without waiting for the slower groups in the batch.
+    """
+    if cleanup_options is None: cleanup_options = {}
+    results = [None] * len(jobs)
+    groups = {}
+
+    def record(index, success, result_or_error):
+        results[index] = (success, result_or_error)
+        if on_result: on_result(index, success, result_or_error)
+
+    for index, job in enumerate(jobs):
+        try:
+            audio = AudioSegment.from_file(job['input_path'])
+        except Exception as e:
+            logger.error(f"Error loading '{job['input_path']}' for batched cleanup: {e}", exc_info=True)
+            record(index, False, str(e))
+            continue
+        group_key = (audio.frame_rate, audio.channels, audio.sample_width)
+        if len(audio) > max_batch_duration_ms:
+            group_key += (index,) # Too long to pad others to; runs as a batch of one
+        groups.setdefault(group_key, []).append((index, audio))
+
+    logger.info(f"Batched cleanup: {len(jobs)} clips in {len(groups)} compatible groups. Options={cleanup_options}")
+
+    # Smallest groups first, so a long batch-of-one never holds up the short clips.
+    for group_key, members in sorted(groups.items(), key=lambda item: max(len(audio) for _, audio in item[1])):
+        indices = [index for index, _ in members]
+        try:
+            cleaned_segments = _apply_cleanup_stages_batch([audio for _, audio in members], cleanup_options)
+        except Exception as e:
+            logger.error(f"Error in batched cleanup for group {group_key}: {e}", exc_info=True)
+            for index in indices:
+                record(index, False, str(e))
+            continue
+
+        for index, audio in zip(indices, cleaned_segments):
+            output_path = jobs[index]['output_path']
+            try:
+                _export_audio(audio, output_path, jobs[index]['output_format'])
+                record(index, True, os.path.basename(output_path))
+            except Exception as e:
+                logger.error(f"Error exporting batched clip to '{output_path}': {e}", exc_info=True)
+                if os.path.exists(output_path):
+                    try: os.remove(output_path)
+                    except OSError as oe: logger.error(f"Could not remove partial output '{output_path}': {oe}")
+                record(index, False, str(e))
+
+    return results
@@ -0,0 +1,98 @@
+import os
+import json
+import atexit
+import uuid
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ShortClipBatcher:
+    """
+    Collects short-clip cleanup jobs for a few milliseconds and dispatches them to Celery as one
+    perform_audio_cleanup_batch_task. Jobs are grouped by output format and cleanup options so every
+    clip in a batch runs the same stage chain; the worker further groups them by sample rate.
+    Each job gets its own task_id up front, which is what the client polls via /status/<task_id>.
+
+    Pending jobs live in this web process only, so batches never span processes (each gunicorn worker
+    batches its own uploads). They are flushed at interpreter exit, e.g. when gunicorn recycles a worker
+    after max_requests; a process that is killed outright loses them, and their clients stay PENDING.
+    """
+
+    def __init__(self, window_ms=20, max_batch_size=16):
+        self.window_s = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        self._pending = {} # batch key -> list of job dicts
+        self._timers = {} # batch key -> threading.Timer that flushes it
+        atexit.register(self.flush_all)
+
+    def submit(self, input_filepath, original_filename, output_filename_base, output_format, cleanup_options):
+        """Queues a job for the next batch and returns the task_id its result will be stored under."""
+        task_id = uuid.uuid4().hex
+        job = {
+            'task_id': task_id,
+            'input_filepath': input_filepath,
+            'original_filename': original_filename,
+            'output_filename_base': output_filename_base,
+        }
+        key = (output_format, json.dumps(cleanup_options, sort_keys=True))
+
+        with self._lock:
+            self._pending.setdefault(key, []).append(job)
+            if len(self._pending[key]) >= self.max_batch_size:
+                jobs = self._take(key)
+            else:
+                jobs = None
+                if key not in self._timers:
+                    timer = threading.Timer(self.window_s, self._flush, args=(key,))
+                    timer.daemon = True
+                    self._timers[key] = timer
+                    timer.start()
+
+        if jobs:
+            self._dispatch(key, jobs)
+        return task_id
+
+    def flush_all(self):
+        """Dispatches every pending batch immediately."""
+        with self._lock:
+            batches = [(key, self._take(key)) for key in list(self._pending)]
+        for key, jobs in batches:
+            if jobs:
+                self._dispatch(key, jobs)
+
+    def _take(self, key):
+        """Removes and returns the pending jobs for `key`. Caller must hold the lock."""
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        return self._pending.pop(key, [])
+
+    def _flush(self, key):
+        with self._lock:
+            jobs = self._take(key)
+        if jobs:
+            self._dispatch(key, jobs)
+
+    def _dispatch(self, key, jobs):
+        from app.tasks import perform_audio_cleanup_batch_task # Imported lazily to avoid a circular import
+
+        output_format, cleanup_options_json = key
+        try:
+            batch_task = perform_audio_cleanup_batch_task.delay(jobs, output_format, json.loads(cleanup_options_json))
+            logger.info(f"Dispatched Celery batched cleanup task {batch_task.id} for {len(jobs)} clips: {[job['task_id'] for job in jobs]}")
+        except Exception as e:
+            logger.error(f"Error dispatching batched cleanup task for {len(jobs)} clips: {e}", exc_info=True)
+            for job in jobs:
+                try:
+                    perform_audio_cleanup_batch_task.backend.mark_as_failure(
+                        job['task_id'], RuntimeError(f'Server error during task dispatch: {str(e)}')
+                    )
+                except Exception as store_error:
+                    logger.error(f"Could not record dispatch failure for job {job['task_id']}: {store_error}")
+                if os.path.exists(job['input_filepath']):
+                    try:
+                        os.remove(job['input_filepath'])
+                    except OSError:
+                        logger.error(f"Could not remove {job['input_filepath']} after dispatch error.")
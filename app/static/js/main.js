@@ -2,6 +2,9 @@
 document.addEventListener('DOMContentLoaded', function() {
     const uploadForm = document.getElementById('upload-form');
     const submitButton = document.getElementById('submit-button');
+    const previewButton = document.getElementById('preview-button');
+    const previewPlayer = document.getElementById('preview-player');
+    const previewPlayerContainer = document.getElementById('preview-player-container');
     const fileInput = document.getElementById('file');
     const fileNameDisplay = document.getElementById('file-name-display');
     const fileDropZone = document.getElementById('file-drop-zone');
@@ -13,6 +16,10 @@ document.addEventListener('DOMContentLoaded', function() {
     const errorDetailsContainer = document.getElementById('error-details-container');
 
     let currentTaskPollInterval = null;
+    let currentPreviewPollInterval = null;
+    let currentPreviewTimeout = null;
+    let storedUploadId = null; // Server-side copy of the selected file, kept after the first preview
+    const PREVIEW_TIMEOUT_MS = 30000;
 
     function setupToolParameterSlider(checkboxId, sliderId, valueDisplayId, unit = '', isFloat = false) {
         const checkbox = document.getElementById(checkboxId);
@@ -46,6 +53,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     if (fileInput && fileNameDisplay) {
         fileInput.addEventListener('change', function() {
+            storedUploadId = null;
             if (fileInput.files.length > 0) {
                 fileNameDisplay.textContent = `Selected: ${fileInput.files[0].name}`;
                 if(fileDropZone) fileDropZone.classList.add('file-selected-visual');
@@ -79,6 +87,46 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    function appendAudioSource(formData) {
+        // Reuse the file already on the server (from a preview) instead of uploading it again.
+        if (storedUploadId) {
+            formData.append('upload_id', storedUploadId);
+            formData.append('original_filename', fileInput.files[0].name);
+        } else {
+            formData.append('file', fileInput.files[0], fileInput.files[0].name);
+        }
+    }
+
+    function collectCleanupOptions() {
+        const cleanup_options = {};
+        if (document.getElementById('enable_normalization').checked) {
+            cleanup_options.normalize = {
+                enabled: true,
+                target_dbfs: parseFloat(document.getElementById('normalization_target_dbfs').value)
+            };
+        }
+        if (document.getElementById('enable_noise_reduction').checked) {
+            cleanup_options.noise_reduce = {
+                enabled: true,
+                strength: parseFloat(document.getElementById('noise_reduction_strength').value)
+            };
+        }
+        if (document.getElementById('enable_high_pass_filter').checked) {
+            cleanup_options.high_pass = {
+                enabled: true,
+                cutoff_hz: parseInt(document.getElementById('high_pass_cutoff_hz').value)
+            };
+        }
+        if (document.getElementById('enable_silence_trimming').checked) {
+            cleanup_options.trim_silence = {
+                enabled: true,
+                min_silence_ms: parseInt(document.getElementById('trim_min_silence_ms').value),
+                insert_ms: parseInt(document.getElementById('trim_insert_silence_ms').value)
+            };
+        }
+        return cleanup_options;
+    }
+
     if (uploadForm) {
         uploadForm.addEventListener('submit', function(event) {
             event.preventDefault();
@@ -91,39 +139,16 @@ document.addEventListener('DOMContentLoaded', function() {
             disableForm(true, "Preparing audio...");
 
             const formData = new FormData();
-            formData.append('file', fileInput.files[0], fileInput.files[0].name);
+            const usedStoredUpload = storedUploadId !== null;
+            appendAudioSource(formData);
+            storedUploadId = null; // The cleanup job deletes its input when done
             
             const outputFormatSelect = document.getElementById('output_format');
             if (outputFormatSelect) {
                 formData.append('output_format', outputFormatSelect.value);
             }
 
-            const cleanup_options = {};
-            if (document.getElementById('enable_normalization').checked) {
-                cleanup_options.normalize = {
-                    enabled: true,
-                    target_dbfs: parseFloat(document.getElementById('normalization_target_dbfs').value)
-                };
-            }
-            if (document.getElementById('enable_noise_reduction').checked) {
-                cleanup_options.noise_reduce = {
-                    enabled: true,
-                    strength: parseFloat(document.getElementById('noise_reduction_strength').value)
-                };
-            }
-            if (document.getElementById('enable_high_pass_filter').checked) {
-                cleanup_options.high_pass = {
-                    enabled: true,
-                    cutoff_hz: parseInt(document.getElementById('high_pass_cutoff_hz').value)
-                };
-            }
-            if (document.getElementById('enable_silence_trimming').checked) {
-                cleanup_options.trim_silence = {
-                    enabled: true,
-                    min_silence_ms: parseInt(document.getElementById('trim_min_silence_ms').value),
-                    insert_ms: parseInt(document.getElementById('trim_insert_silence_ms').value)
-                };
-            }
+            const cleanup_options = collectCleanupOptions();
             formData.append('cleanup_options', JSON.stringify(cleanup_options));
 
             console.log("FormData entries (Cleanup):");
@@ -145,6 +170,9 @@ document.addEventListener('DOMContentLoaded', function() {
             })
             .then(response => {
                 console.log("Response status from server:", response.status);
+                if (response.status === 404 && usedStoredUpload) {
+                    throw new Error('The previously uploaded file has expired. Please submit again to re-upload it.');
+                }
                 if (!response.ok) {
                     return response.json().then(errData => {
                         console.error("Server error JSON:", errData);
@@ -177,6 +205,77 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    if (previewButton) {
+        previewButton.addEventListener('click', function() {
+            if (!fileInput.files || fileInput.files.length === 0) {
+                handleError("Please select an audio file to preview.", false, true);
+                return;
+            }
+
+            previewButton.disabled = true;
+            previewButton.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Rendering Preview...';
+            requestPreview();
+        });
+    }
+
+    function requestPreview() {
+        const formData = new FormData();
+        const usedStoredUpload = storedUploadId !== null;
+        appendAudioSource(formData);
+        formData.append('output_format', 'wav');
+        formData.append('preview_start_s', document.getElementById('preview_start_s').value || '0');
+        formData.append('cleanup_options', JSON.stringify(collectCleanupOptions()));
+
+        fetch('/preview', { method: 'POST', body: formData })
+        .then(response => response.json().then(data => {
+            if (response.status === 404 && usedStoredUpload && data.upload_expired) {
+                storedUploadId = null; // Stored copy is gone, send the file again
+                return requestPreview();
+            }
+            if (!response.ok) throw new Error(data.error || `Server error: ${response.status}`);
+            storedUploadId = data.upload_id || null;
+            pollPreviewStatus(data.task_id);
+        }))
+        .catch(error => {
+            console.error('Preview fetch error:', error);
+            stopPreviewPolling();
+            handleError(`Preview failed: ${error.message}`, false, true);
+        });
+    }
+
+    function pollPreviewStatus(taskId) {
+        stopPreviewPolling();
+        previewButton.disabled = true;
+        // Previews are short, so poll much more often than full jobs, but give up if no worker picks it up.
+        currentPreviewTimeout = setTimeout(() => {
+            stopPreviewPolling();
+            handleError('Preview timed out. Make sure a worker is consuming the "preview" queue.', false, true);
+        }, PREVIEW_TIMEOUT_MS);
+        currentPreviewPollInterval = setInterval(() => {
+            fetch(`/status/${taskId}`).then(r => r.ok ? r.json() : Promise.reject(r)).then(data => {
+                if (data.state !== 'SUCCESS' && data.state !== 'FAILURE') return;
+                stopPreviewPolling();
+                if (data.state === 'SUCCESS' && data.download_url) {
+                    previewPlayer.src = data.download_url;
+                    previewPlayerContainer.style.display = 'block';
+                    previewPlayer.play().catch(() => {});
+                } else {
+                    handleError(`Preview failed: ${data.status_message || data.status || 'Unknown error'}`, false, true);
+                }
+            }).catch(err => console.error('Preview polling error:', err));
+        }, 250);
+    }
+
+    function stopPreviewPolling() {
+        if (currentPreviewPollInterval) { clearInterval(currentPreviewPollInterval); currentPreviewPollInterval = null; }
+        if (currentPreviewTimeout) { clearTimeout(currentPreviewTimeout); currentPreviewTimeout = null; }
+        resetPreviewButton();
+    }
+
+    function resetPreviewButton() {
+        if (previewButton) { previewButton.disabled = false; previewButton.innerHTML = '<i class="bi bi-play-circle"></i> Preview Excerpt'; }
+    }
+
     function pollTaskStatus(taskId, originalFileName = "your file") {
         if (currentTaskPollInterval) { clearInterval(currentTaskPollInterval); }
         currentTaskPollInterval = setInterval(() => {
@@ -5,7 +5,7 @@ from celery import shared_task, current_task
 from flask import current_app 
 
 # Import the NEW core processing function for cleanup
-from app.services.audio_processor import cleanup_audio_core # <<< ENSURE THIS IS THE IMPORT
+from app.services.audio_processor import cleanup_audio_core, preview_audio_core, cleanup_audio_batch_core # <<< ENSURE THIS IS THE IMPORT
 
 import logging
 logger = logging.getLogger(__name__)
@@ -19,12 +19,15 @@ def perform_audio_cleanup_task(self, input_filepath, original_filename, output_f
     
     output_folder = current_app.config['PROCESSED_FOLDER']
     output_filepath = os.path.join(output_folder, f"{output_filename_base}.{output_format}")
+    started_at = time.time() # Reported in task meta so queue wait and worker busy time can be measured
 
     try:
-        self.update_state(state='PROGRESS', meta={'status': 'Initializing audio cleanup...', 'progress': 1, 'original_filename': original_filename})
+        self.update_state(state='PROGRESS', meta={'status': 'Initializing audio cleanup...', 'progress': 1, 'original_filename': original_filename, 'started_at': started_at})
         
         def update_celery_meta(state, meta):
-            meta_to_update = {'original_filename': original_filename}
+            meta_to_update = {'original_filename': original_filename, 'started_at': started_at}
+            if state == 'SUCCESS': # cleanup_audio_core reports SUCCESS once exported, before the task returns
+                meta_to_update['finished_at'] = time.time()
             meta_to_update.update(meta)
             self.update_state(state=state, meta=meta_to_update)
 
@@ -38,14 +41,16 @@ def perform_audio_cleanup_task(self, input_filepath, original_filename, output_f
 
         if success:
             logger.info(f"Cleanup task {self.request.id} completed successfully. Output: {result_or_error}")
-            return {'status': 'Audio cleaned successfully!', 'progress': 100, 'result_filename': result_or_error, 'original_filename': original_filename}
+            return {'status': 'Audio cleaned successfully!', 'progress': 100, 'result_filename': result_or_error, 'original_filename': original_filename, 'started_at': started_at, 'finished_at': time.time()}
         else:
             logger.error(f"Cleanup task {self.request.id} failed for {original_filename}. Error: {result_or_error}")
             failure_meta = {
                 'status': f'Audio cleanup error: {result_or_error}', 
                 'progress': 0, 
                 'original_filename': original_filename, 
-                'error_details': result_or_error
+                'error_details': result_or_error,
+                'started_at': started_at,
+                'finished_at': time.time()
             }
             if self.AsyncResult(self.request.id).state != 'FAILURE':
                  self.update_state(state='FAILURE', meta=failure_meta)
@@ -57,7 +62,9 @@ def perform_audio_cleanup_task(self, input_filepath, original_filename, output_f
             'status': f'Critical task error: {str(e)}', 
             'progress': 0, 
             'original_filename': original_filename,
-            'error_details': str(e)
+            'error_details': str(e),
+            'started_at': started_at,
+            'finished_at': time.time()
         }
         self.update_state(state='FAILURE', meta=critical_error_meta)
         return critical_error_meta
@@ -70,6 +77,107 @@ def perform_audio_cleanup_task(self, input_filepath, original_filename, output_f
                 logger.error(f"Error cleaning up uploaded file {input_filepath} for cleanup task: {e}")
 
 
+@shared_task(bind=True, name='app.tasks.perform_audio_cleanup_batch_task', ignore_result=True)
+def perform_audio_cleanup_batch_task(self, jobs, output_format, cleanup_options):
+    """
+    Celery task that cleans a micro-batch of short clips collected by ShortClipBatcher.
+    Each job carries the pre-assigned task_id its client polls; results are stored under those ids.
+    """
+    logger.info(f"Celery batched cleanup task {self.request.id} started for {len(jobs)} clips with options: {cleanup_options}")
+
+    output_folder = current_app.config['PROCESSED_FOLDER']
+    started_at = time.time()
+    for job in jobs:
+        job['output_path'] = os.path.join(output_folder, f"{job['output_filename_base']}.{output_format}")
+        job['output_format'] = output_format
+        self.backend.store_result(job['task_id'], {'status': 'Cleaning audio...', 'progress': 10, 'original_filename': job['original_filename'], 'started_at': started_at}, 'PROGRESS')
+
+    def store_job_result(index, success, result_or_error):
+        # Called per clip as soon as its group is exported, so short clips don't wait for the whole batch.
+        job = jobs[index]
+        finished_at = time.time()
+        if success:
+            logger.info(f"Batched cleanup job {job['task_id']} completed successfully. Output: {result_or_error}")
+            self.backend.store_result(job['task_id'], {'status': 'Audio cleaned successfully!', 'progress': 100, 'result_filename': result_or_error, 'original_filename': job['original_filename'], 'started_at': started_at, 'finished_at': finished_at}, 'SUCCESS')
+        else:
+            logger.error(f"Batched cleanup job {job['task_id']} failed for {job['original_filename']}. Error: {result_or_error}")
+            # FAILURE results must be exceptions: Celery can't read a plain dict back from a FAILURE state.
+            # /status reports str(task.info) as the status_message.
+            self.backend.mark_as_failure(job['task_id'], RuntimeError(f'Audio cleanup error: {result_or_error}'))
+        job['result_stored'] = True
+
+    try:
+        cleanup_audio_batch_core(
+            [{'input_path': job['input_filepath'], 'output_path': job['output_path'], 'output_format': output_format} for job in jobs],
+            cleanup_options=cleanup_options,
+            max_batch_duration_ms=int(float(current_app.config['MICROBATCH_MAX_DURATION_S']) * 1000),
+            on_result=store_job_result
+        )
+    except Exception as e:
+        logger.critical(f"Critical error in Celery batched cleanup task {self.request.id}: {e}", exc_info=True)
+        for index, job in enumerate(jobs):
+            if not job.get('result_stored'):
+                store_job_result(index, False, str(e))
+    finally:
+        for job in jobs:
+            if os.path.exists(job['input_filepath']):
+                try:
+                    os.remove(job['input_filepath'])
+                    logger.info(f"Cleaned up uploaded file for batched cleanup task: {job['input_filepath']}")
+                except OSError as e:
+                    logger.error(f"Error cleaning up uploaded file {job['input_filepath']} for batched cleanup task: {e}")
+
+
+@shared_task(bind=True, name='app.tasks.perform_audio_preview_task')
+def perform_audio_preview_task(self, input_filepath, original_filename, output_filename_base, output_format, cleanup_options, start_ms, duration_ms):
+    """
+    Celery task to render a short cleaned excerpt so settings can be auditioned before the full job.
+    Routed to the 'preview' queue (see CELERY_TASK_ROUTES). The input is kept so later previews and the
+    full job can reuse it by upload id; the full job or cleanup_preview_uploads_task removes it.
+    """
+    logger.info(f"Celery audio preview task {self.request.id} started for {original_filename} (start={start_ms}ms, duration={duration_ms}ms)")
+
+    output_folder = current_app.config['PROCESSED_FOLDER']
+    output_filepath = os.path.join(output_folder, f"{output_filename_base}.{output_format}")
+
+    try:
+        success, result_or_error = preview_audio_core(
+            input_path=input_filepath,
+            output_path=output_filepath,
+            output_format=output_format,
+            cleanup_options=cleanup_options,
+            start_ms=start_ms,
+            duration_ms=duration_ms
+        )
+
+        if success:
+            logger.info(f"Preview task {self.request.id} completed successfully. Output: {result_or_error}")
+            return {'status': 'Preview ready!', 'progress': 100, 'result_filename': result_or_error, 'original_filename': original_filename, 'is_preview': True}
+        else:
+            logger.error(f"Preview task {self.request.id} failed for {original_filename}. Error: {result_or_error}")
+            failure_meta = {
+                'status': f'Audio preview error: {result_or_error}',
+                'progress': 0,
+                'original_filename': original_filename,
+                'error_details': result_or_error,
+                'is_preview': True
+            }
+            self.update_state(state='FAILURE', meta=failure_meta)
+            return failure_meta
+
+    except Exception as e:
+        logger.critical(f"Critical error in Celery preview task {self.request.id} for {original_filename}: {e}", exc_info=True)
+        critical_error_meta = {
+            'status': f'Critical task error: {str(e)}',
+            'progress': 0,
+            'original_filename': original_filename,
+            'error_details': str(e),
+            'is_preview': True
+        }
+        self.update_state(state='FAILURE', meta=critical_error_meta)
+        return critical_error_meta
+
+
 @shared_task(name='app.tasks.cleanup_old_files_task')
 def cleanup_old_files_task(max_age_days=7):
     upload_folder = current_app.config['UPLOAD_FOLDER']
@@ -105,3 +213,29 @@ def cleanup_old_files_task(max_age_days=7):
              logger.error(f"Cleanup: Error listing files in '{folder_path}': {e}", exc_info=True)
     logger.info(f"Cleanup task finished. Deleted {cleaned_count} old files.")
     return f"Cleaned up {cleaned_count} files older than {max_age_days_int} days."
+
+
+@shared_task(name='app.tasks.cleanup_preview_uploads_task')
+def cleanup_preview_uploads_task(ttl_s=3600):
+    """Deletes inputs kept for reuse after a preview that haven't been previewed or submitted for ttl_s seconds."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    cutoff = time.time() - int(ttl_s)
+    cleaned_count = 0
+    if not os.path.isdir(upload_folder):
+        logger.warning(f"Preview upload cleanup: Folder '{upload_folder}' does not exist. Skipping.")
+        return "Cleaned up 0 preview uploads."
+    for filename in os.listdir(upload_folder):
+        if '_preview_input' not in filename:
+            continue
+        filepath = os.path.join(upload_folder, filename)
+        try:
+            if os.path.getmtime(filepath) < cutoff:
+                os.remove(filepath)
+                logger.info(f"Preview upload cleanup: Deleted expired file '{filepath}'")
+                cleaned_count += 1
+        except FileNotFoundError:
+            pass # Submitted (renamed) or already removed since listing
+        except OSError as e:
+            logger.error(f"Preview upload cleanup: Error deleting file '{filepath}': {e}")
+    logger.info(f"Preview upload cleanup finished. Deleted {cleaned_count} files older than {ttl_s} s.")
+    return f"Cleaned up {cleaned_count} preview uploads older than {ttl_s} s."
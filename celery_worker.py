@@ -9,7 +9,10 @@ flask_app = create_app()
 celery_app = flask_app.extensions["celery"]
 
 # You might need to run the worker with:
-# celery -A celery_worker.celery_app worker --loglevel=info
+# celery -A celery_worker.celery_app worker --loglevel=info -Q preview,celery
+# Preview tasks are routed to the 'preview' queue (CELERY_TASK_ROUTES in config.py); a worker that
+# doesn't list it in -Q never picks them up. For fast previews under load, run a dedicated one:
+# celery -A celery_worker.celery_app worker --loglevel=info -Q preview -n preview@%h
 # Or, if your tasks are in app.tasks:
 # celery -A app.tasks.celery worker --loglevel=info (if celery is defined in tasks.py)
 # The celery_init_app in __init__.py should make `flask_app.extensions["celery"]` the main celery app.
@@ -24,6 +27,6 @@ celery_app = flask_app.extensions["celery"]
 # celery_app.autodiscover_tasks(['app']) # if your tasks are in 'app.tasks' module
 
 # The command to run will typically be:
-# celery -A celery_worker.celery_app worker -l INFO -B
+# celery -A celery_worker.celery_app worker -l INFO -B -Q preview,celery
 # The -B flag runs the beat scheduler embedded in the worker, useful for development.
 # For production, run worker and beat as separate processes.
\ No newline at end of file
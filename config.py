@@ -14,6 +14,26 @@ class Config:
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
     # CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True # For Celery 5+
+    # Previews go to their own 'preview' queue. Every deployment needs a worker consuming it
+    # (e.g. `-Q preview,celery`), or previews stay PENDING. A shared worker can still be busy with
+    # full-length jobs it already started or prefetched; run a dedicated `-Q preview` worker so
+    # previews never wait behind them.
+    CELERY_TASK_ROUTES = {
+        'app.tasks.perform_audio_preview_task': {'queue': 'preview'},
+    }
+
+    # Micro-batching of short clips: WAV uploads up to MICROBATCH_MAX_DURATION_S long (read from the
+    # header) are collected for MICROBATCH_WINDOW_MS and cleaned together in one Celery task (see
+    # app/services/batch_dispatcher.py). Batches only form within a single web process.
+    MICROBATCH_ENABLED = os.environ.get('MICROBATCH_ENABLED', 'True').lower() in ('true', '1', 't')
+    MICROBATCH_WINDOW_MS = int(os.environ.get('MICROBATCH_WINDOW_MS', 20))
+    MICROBATCH_MAX_SIZE = int(os.environ.get('MICROBATCH_MAX_SIZE', 16))
+    MICROBATCH_MAX_DURATION_S = float(os.environ.get('MICROBATCH_MAX_DURATION_S', 30))
+
+    # Preview Configuration
+    PREVIEW_DEFAULT_DURATION_S = float(os.environ.get('PREVIEW_DEFAULT_DURATION_S', 5))
+    PREVIEW_MAX_DURATION_S = float(os.environ.get('PREVIEW_MAX_DURATION_S', 10)) # Noise reduction makes longer previews slow
+    PREVIEW_UPLOAD_TTL_S = int(os.environ.get('PREVIEW_UPLOAD_TTL_S', 3600)) # Inputs kept for reuse after a preview are deleted this long after their last preview
 
     # File Paths
     UPLOAD_FOLDER = os.path.join(basedir, os.environ.get('UPLOAD_FOLDER_REL', 'uploads'))
@@ -46,6 +66,11 @@ class Config:
             # ),
             'args': (int(os.environ.get('CLEANUP_MAX_FILE_AGE_DAYS', 7)),)
         },
+        'cleanup-preview-uploads': {
+            'task': 'app.tasks.cleanup_preview_uploads_task',
+            'schedule': timedelta(minutes=5),
+            'args': (PREVIEW_UPLOAD_TTL_S,)
+        },
     }
     # For cron from .env to work, you'd import from celery.schedules.crontab
     # and adjust CELERY_BEAT_SCHEDULE accordingly. For simplicity timedelta is used here.
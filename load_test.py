@@ -0,0 +1,337 @@
+"""
+End-to-end load test for the upload -> task -> download path.
+
+Drives /upload, /status/<task_id> and /download/<filename> with a configurable number of concurrent
+clients and a mix of clip durations, then reports latency percentiles, time-to-result, queue wait
+and worker utilization.
+
+Against a running deployment (Flask + Celery workers + Redis):
+    python load_test.py --url http://localhost:5000 --requests 200 --concurrency 16 --worker-concurrency 4
+
+Fully in-process (Flask dev server + Celery worker threads with an in-memory broker, no Redis needed):
+    python load_test.py --in-process --requests 50 --concurrency 8 --worker-concurrency 2
+
+Queue wait is `started_at` (reported by the task) minus `queued_at` (returned by /upload), so the web
+server and the workers are assumed to share a clock. Clips cleaned in one micro-batch share a start
+time; worker busy time counts each batch once, up to its last clip.
+"""
+import os
+import io
+import json
+import math
+import time
+import uuid
+import wave
+import random
+import shutil
+import struct
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Cleanup options sent with every upload (the defaults of the web UI).
+DEFAULT_CLEANUP_OPTIONS = {
+    'noise_reduce': {'enabled': True, 'strength': 0.8},
+    'high_pass': {'enabled': True, 'cutoff_hz': 80},
+    'normalize': {'enabled': True, 'target_dbfs': -16},
+}
+DEFAULT_DURATION_MIX = '5:0.4,15:0.3,30:0.2,120:0.1' # clip seconds:weight
+SAMPLE_RATE = 44100
+
+# --- Test Audio ---
+
+def _make_wav_bytes(duration_s, sample_rate=SAMPLE_RATE):
+    """Returns a mono 16-bit WAV of a 440 Hz tone mixed with white noise."""
+    rng = random.Random(duration_s)
+    frame_count = int(duration_s * sample_rate)
+    samples = (
+        int(8000 * math.sin(2 * math.pi * 440 * i / sample_rate) + rng.uniform(-1500, 1500))
+        for i in range(frame_count)
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(struct.pack(f'<{frame_count}h', *samples))
+    return buffer.getvalue()
+
+def _parse_duration_mix(mix):
+    """Parses '5:0.4,30:0.6' into ([5.0, 30.0], [0.4, 0.6])."""
+    durations, weights = [], []
+    for item in mix.split(','):
+        duration, _, weight = item.partition(':')
+        durations.append(float(duration))
+        weights.append(float(weight or 1))
+    return durations, weights
+
+# --- HTTP Helpers ---
+
+def _encode_multipart(fields, file_field, filename, file_bytes):
+    boundary = uuid.uuid4().hex
+    lines = []
+    for name, value in fields.items():
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    lines.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+        f'Content-Type: audio/wav\r\n\r\n'.encode()
+    )
+    lines.append(file_bytes)
+    lines.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(lines), f'multipart/form-data; boundary={boundary}'
+
+def _request(url, data=None, headers=None, timeout=60):
+    """Performs an HTTP request and returns (status_code, body_bytes, elapsed_seconds)."""
+    request = urllib.request.Request(url, data=data, headers=headers or {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        status = e.code
+    return status, body, time.perf_counter() - start
+
+# --- Single Client Job ---
+
+def run_job(base_url, duration_s, wav_bytes, poll_interval_s, timeout_s, output_format):
+    """Uploads one clip, polls until it finishes and downloads the result. Returns a metrics dict."""
+    metrics = {'duration_s': duration_s, 'ok': False, 'status_latencies': []}
+    body, content_type = _encode_multipart(
+        {'output_format': output_format, 'cleanup_options': json.dumps(DEFAULT_CLEANUP_OPTIONS)},
+        'file', f'loadtest_{int(duration_s)}s.wav', wav_bytes
+    )
+    job_start = time.perf_counter()
+    try:
+        status, response_body, elapsed = _request(f'{base_url}/upload', data=body, headers={'Content-Type': content_type})
+        metrics['upload_latency'] = elapsed
+        if status != 202:
+            metrics['error'] = f'upload returned {status}: {response_body[:200]!r}'
+            return metrics
+        upload_data = json.loads(response_body)
+        task_id = upload_data['task_id']
+        metrics['queued_at'] = upload_data.get('queued_at')
+
+        deadline = time.perf_counter() + timeout_s
+        while True:
+            status, response_body, elapsed = _request(f'{base_url}/status/{task_id}')
+            metrics['status_latencies'].append(elapsed)
+            if status != 200:
+                metrics['status_error_code'] = status
+                metrics['error'] = f'status returned {status}: {response_body[:200]!r}'
+                return metrics
+            status_data = json.loads(response_body)
+            if status_data.get('state') in ('SUCCESS', 'FAILURE'):
+                break
+            if time.perf_counter() > deadline:
+                metrics['error'] = f'timed out after {timeout_s}s in state {status_data.get("state")}'
+                return metrics
+            time.sleep(poll_interval_s)
+
+        metrics['time_to_result'] = time.perf_counter() - job_start
+        metrics['started_at'] = status_data.get('started_at')
+        metrics['finished_at'] = status_data.get('finished_at')
+        if status_data['state'] == 'FAILURE' or not status_data.get('result_filename'):
+            metrics['error'] = f'task failed: {status_data.get("status_message") or status_data.get("status")}'
+            return metrics
+
+        status, response_body, elapsed = _request(f'{base_url}/download/{status_data["result_filename"]}')
+        metrics['download_latency'] = elapsed
+        if status != 200:
+            metrics['error'] = f'download returned {status}'
+            return metrics
+        metrics['ok'] = True
+    except Exception as e:
+        metrics['error'] = f'{type(e).__name__}: {e}'
+    return metrics
+
+# --- Queue Depth Sampling (Redis broker only) ---
+
+class QueueDepthSampler(threading.Thread):
+    """Samples the length of the Celery queues in Redis until stopped."""
+
+    def __init__(self, broker_url, queues=('celery', 'preview'), interval_s=0.5):
+        super().__init__(daemon=True)
+        import redis # Only needed when a Redis broker URL is given
+        self.client = redis.Redis.from_url(broker_url)
+        self.queues = queues
+        self.interval_s = interval_s
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.samples.append(sum(self.client.llen(queue) for queue in self.queues))
+            except Exception as e:
+                print(f"Queue depth sampling failed: {e}")
+                return
+            self._stop_event.wait(self.interval_s)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+# --- Reporting ---
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+def _format_row(label, values, unit='ms', scale=1000.0):
+    if not values:
+        return f"{label:<22} {'n/a':>10}"
+    p50, p95, p99 = (percentile(values, pct) * scale for pct in (50, 95, 99))
+    return f"{label:<22} {p50:>10.1f} {p95:>10.1f} {p99:>10.1f} {max(values) * scale:>10.1f}  {unit}"
+
+def build_report(results, wall_time_s, worker_concurrency, queue_depth_samples=None):
+    """Returns the text report for a finished run."""
+    succeeded = [r for r in results if r['ok']]
+    failed = [r for r in results if not r['ok']]
+
+    queue_waits = [
+        max(0.0, r['started_at'] - r['queued_at'])
+        for r in results if r.get('started_at') is not None and r.get('queued_at') is not None
+    ]
+    # Clips cleaned in one micro-batch share a start time but finish as their group is exported;
+    # count each task once, from its start to its last finish.
+    busy_until = {}
+    for r in results:
+        if r.get('started_at') and r.get('finished_at'):
+            busy_until[r['started_at']] = max(busy_until.get(r['started_at'], 0.0), r['finished_at'])
+    busy_time_s = sum(finished - started for started, finished in busy_until.items())
+
+    lines = [
+        f"Requests: {len(results)}  succeeded: {len(succeeded)}  failed: {len(failed)}  wall time: {wall_time_s:.1f}s  "
+        f"throughput: {len(succeeded) / wall_time_s if wall_time_s else 0:.2f} jobs/s",
+        '',
+        f"{'metric':<22} {'p50':>10} {'p95':>10} {'p99':>10} {'max':>10}",
+        _format_row('upload latency', [r['upload_latency'] for r in results if 'upload_latency' in r]),
+        _format_row('status latency', [latency for r in results for latency in r['status_latencies']]),
+        _format_row('download latency', [r['download_latency'] for r in results if 'download_latency' in r]),
+        _format_row('queue wait', queue_waits),
+        _format_row('time to result', [r['time_to_result'] for r in succeeded], unit='s', scale=1.0),
+        '',
+    ]
+    if worker_concurrency:
+        utilization = busy_time_s / (wall_time_s * worker_concurrency) if wall_time_s else 0.0
+        lines.append(f"Worker utilization: {utilization * 100:.1f}% ({busy_time_s:.1f}s busy over {worker_concurrency} worker slots)")
+    status_errors = {}
+    for r in results:
+        if 'status_error_code' in r:
+            status_errors[r['status_error_code']] = status_errors.get(r['status_error_code'], 0) + 1
+    if status_errors:
+        lines.append(f"Status errors: {', '.join(f'{count} x HTTP {code}' for code, count in sorted(status_errors.items()))}")
+    if queue_depth_samples:
+        lines.append(f"Queue depth: max {max(queue_depth_samples)}, mean {sum(queue_depth_samples) / len(queue_depth_samples):.1f}")
+    if failed:
+        lines.append('')
+        lines.append('First failures:')
+        lines.extend(f"  {r['duration_s']:.0f}s clip: {r.get('error')}" for r in failed[:5])
+    return '\n'.join(lines)
+
+# --- In-process Stack ---
+
+def start_in_process_stack(worker_concurrency):
+    """
+    Starts the real Flask app and a Celery worker inside this process, using an in-memory broker and
+    result backend instead of Redis. Returns (base_url, stop_callable).
+    """
+    from werkzeug.serving import make_server
+    from celery.contrib.testing.worker import start_worker
+    from config import Config
+    from app import create_app
+
+    work_dir = tempfile.mkdtemp(prefix='audio_loadtest_')
+
+    class LoadTestConfig(Config):
+        TESTING = True
+        CELERY_BROKER_URL = 'memory://'
+        CELERY_RESULT_BACKEND = 'cache+memory://'
+        UPLOAD_FOLDER = os.path.join(work_dir, 'uploads')
+        PROCESSED_FOLDER = os.path.join(work_dir, 'processed_audio')
+
+    flask_app = create_app(LoadTestConfig)
+    celery_app = flask_app.extensions['celery']
+
+    worker_context = start_worker(celery_app, pool='threads', concurrency=worker_concurrency, perform_ping_check=False)
+    worker_context.__enter__()
+
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    print(f"In-process stack started (work dir: {work_dir})")
+
+    def stop():
+        server.shutdown()
+        worker_context.__exit__(None, None, None)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return f'http://127.0.0.1:{server.server_port}', stop
+
+# --- Entry Point ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Base URL of a running deployment, e.g. http://localhost:5000')
+    target.add_argument('--in-process', action='store_true', help='Run Flask and a Celery worker in this process with an in-memory broker')
+    parser.add_argument('--requests', type=int, default=50, help='Total number of uploads (default: 50)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients (default: 8)')
+    parser.add_argument('--duration-mix', default=DEFAULT_DURATION_MIX, help=f'Clip durations in seconds with weights (default: {DEFAULT_DURATION_MIX})')
+    parser.add_argument('--output-format', default='wav', choices=['wav', 'mp3', 'm4a'])
+    parser.add_argument('--worker-concurrency', type=int, default=0, help='Total worker slots, used for the utilization figure (--in-process defaults to 2 worker threads)')
+    parser.add_argument('--broker-url', help='Redis broker URL to sample queue depth from (optional)')
+    parser.add_argument('--poll-interval', type=float, default=0.25, help='Seconds between /status polls (default: 0.25)')
+    parser.add_argument('--timeout', type=float, default=600, help='Per-job timeout in seconds (default: 600)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the duration mix (default: 0)')
+    args = parser.parse_args(argv)
+
+    if args.in_process and args.worker_concurrency <= 0:
+        args.worker_concurrency = 2
+
+    durations, weights = _parse_duration_mix(args.duration_mix)
+    rng = random.Random(args.seed)
+    job_durations = rng.choices(durations, weights=weights, k=args.requests)
+    print(f"Generating test clips for durations {sorted(set(job_durations))}s...")
+    clips = {duration: _make_wav_bytes(duration) for duration in set(job_durations)}
+
+    stop_stack = None
+    base_url = args.url.rstrip('/') if args.url else None
+    if args.in_process:
+        base_url, stop_stack = start_in_process_stack(args.worker_concurrency)
+
+    sampler = None
+    if args.broker_url:
+        sampler = QueueDepthSampler(args.broker_url)
+        sampler.start()
+
+    print(f"Running {args.requests} jobs against {base_url} with {args.concurrency} concurrent clients...")
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(
+                lambda duration: run_job(base_url, duration, clips[duration], args.poll_interval, args.timeout, args.output_format),
+                job_durations
+            ))
+    finally:
+        wall_time_s = time.perf_counter() - start
+        if sampler:
+            sampler.stop()
+        if stop_stack:
+            stop_stack()
+
+    print()
+    print(build_report(results, wall_time_s, args.worker_concurrency, sampler.samples if sampler else None))
+    return 0 if all(r['ok'] for r in results) else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,38 @@
+import io
+import wave
+
+import pytest
+
+from config import Config
+from app import create_app
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    # Routes are registered on import inside create_app, so one app serves the whole test session.
+    tmp_path = tmp_path_factory.mktemp('audio')
+
+    class TestConfig(Config):
+        TESTING = True
+        CELERY_BROKER_URL = 'memory://'
+        CELERY_RESULT_BACKEND = 'cache+memory://'
+        CELERY_TASK_ALWAYS_EAGER = True
+        CELERY_TASK_STORE_EAGER_RESULT = True
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        PROCESSED_FOLDER = str(tmp_path / 'processed_audio')
+        MICROBATCH_WINDOW_MS = 10
+
+    return create_app(TestConfig)
+
+
+@pytest.fixture
+def wav_bytes():
+    def make(seconds, frame_rate=16000):
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(frame_rate)
+            wav_file.writeframes(b'\x10\x00\xf0\xff' * (seconds * frame_rate // 2))
+        return buffer.getvalue()
+    return make
@@ -0,0 +1,50 @@
+import io
+import json
+import os
+import time
+
+import pytest
+
+
+def _wait_for_final_state(client, task_id, timeout_s=10):
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        response = client.get(f'/status/{task_id}')
+        assert response.status_code == 200
+        if response.json['state'] in ('SUCCESS', 'FAILURE'):
+            return response.json
+        time.sleep(0.02)
+    pytest.fail(f'Task {task_id} did not finish')
+
+
+def test_failed_batched_clip_is_reported_by_status(app, wav_bytes, monkeypatch):
+    from app.services import audio_processor
+
+    def failing_stages(segments, cleanup_options):
+        raise ValueError('cannot clean this clip')
+
+    monkeypatch.setattr(audio_processor, '_apply_cleanup_stages_batch', failing_stages)
+
+    client = app.test_client()
+    response = client.post('/upload', data={
+        'file': (io.BytesIO(wav_bytes(2)), 'clip.wav'),
+        'cleanup_options': json.dumps({'normalize': {'enabled': True}}),
+    })
+    assert response.status_code == 202
+
+    status = _wait_for_final_state(client, response.json['task_id'])
+    assert status['state'] == 'FAILURE'
+    assert 'cannot clean this clip' in status['status_message']
+
+
+def test_batched_clip_succeeds_and_is_downloadable(app, wav_bytes):
+    client = app.test_client()
+    response = client.post('/upload', data={
+        'file': (io.BytesIO(wav_bytes(2)), 'clip.wav'),
+        'cleanup_options': json.dumps({'high_pass': {'enabled': True}, 'normalize': {'enabled': True}}),
+    })
+    assert response.status_code == 202
+
+    status = _wait_for_final_state(client, response.json['task_id'])
+    assert status['state'] == 'SUCCESS'
+    assert os.path.exists(os.path.join(app.config['PROCESSED_FOLDER'], status['result_filename']))
@@ -0,0 +1,57 @@
+import io
+import json
+import os
+import time
+
+from app.tasks import cleanup_preview_uploads_task
+
+
+def _preview(client, **data):
+    data.setdefault('cleanup_options', json.dumps({'normalize': {'enabled': True}}))
+    return client.post('/preview', data=data)
+
+
+def test_unused_preview_upload_expires(app, wav_bytes):
+    client = app.test_client()
+    response = _preview(client, file=(io.BytesIO(wav_bytes(3)), 'clip.wav'), preview_duration_s='1')
+    assert response.status_code == 202
+    upload_id = response.json['upload_id']
+
+    upload_folder = app.config['UPLOAD_FOLDER']
+    kept_path = os.path.join(upload_folder, f'{upload_id}_preview_input.wav')
+    job_path = os.path.join(upload_folder, 'f' * 32 + '_input.wav')
+    with open(job_path, 'wb') as job_file:
+        job_file.write(wav_bytes(1))
+    stale = time.time() - 120
+    for path in (kept_path, job_path):
+        os.utime(path, (stale, stale))
+
+    cleanup_preview_uploads_task.apply(args=(60,)).get()
+
+    assert not os.path.exists(kept_path)
+    assert os.path.exists(job_path) # Inputs of full jobs are never swept by the preview TTL
+    os.remove(job_path)
+
+    response = _preview(client, upload_id=upload_id)
+    assert response.status_code == 404
+    assert response.json['upload_expired']
+
+
+def test_submitted_preview_upload_is_handed_to_the_job(app, wav_bytes):
+    client = app.test_client()
+    response = _preview(client, file=(io.BytesIO(wav_bytes(3)), 'clip.wav'), preview_duration_s='1')
+    assert response.status_code == 202
+    upload_id = response.json['upload_id']
+    kept_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{upload_id}_preview_input.wav')
+    assert os.path.exists(kept_path)
+
+    response = client.post('/upload', data={
+        'upload_id': upload_id,
+        'original_filename': 'clip.wav',
+        'cleanup_options': json.dumps({'normalize': {'enabled': True}}),
+    })
+    assert response.status_code == 202
+    assert not os.path.exists(kept_path)
+
+    response = _preview(client, upload_id=upload_id)
+    assert response.status_code == 404